@@ -1,4 +1,7 @@
 import os
+import re
+import time
+import concurrent.futures
 import cv2
 import numpy as np
 import yaml
@@ -6,15 +9,24 @@ from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton, 
                             QVBoxLayout, QHBoxLayout, QWidget, QInputDialog, 
                             QMessageBox, QFileDialog)
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QT_VERSION
 from PyQt5.QtGui import QImage, QPixmap
 from scipy.spatial.transform import Rotation as R
 
+# 确保OpenCV启用SIMD优化内核和parallel_for_多线程（留一个核给Qt界面）
+cv2.setUseOptimized(True)
+cv2.setNumThreads(max(1, os.cpu_count() - 1))
+_hw_features = [line.strip() for line in cv2.getBuildInformation().splitlines()
+                if "Baseline" in line or "Dispatched code" in line]
+print(f"OpenCV CPU/HW features: {'; '.join(_hw_features)}")
+
 class HandEyeCalibrationUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.init_ui()
         self.load_config()
+        # 棋盘格尺寸元组只构造一次，检测热路径直接复用
+        self._board = (self.XX, self.YY)
         self.init_camera()
         self.init_data_storage()  # 初始化时自动生成符合格式的保存目录
         
@@ -28,8 +40,10 @@ class HandEyeCalibrationUI(QMainWindow):
         # 摄像头显示区域
         self.camera_label = QLabel("摄像头画面")
         self.camera_label.setAlignment(Qt.AlignCenter)
-        self.camera_label.setMinimumSize(640, 480)
+        # 固定label尺寸并缓存，缩放目标和实际几何一致，且每帧不用再查width()/height()
+        self.camera_label.setFixedSize(640, 480)
         main_layout.addWidget(self.camera_label)
+        self._label_w, self._label_h = 640, 480
         
         # 状态显示
         self.status_label = QLabel("就绪 - 按 's' 采集数据，按 'q' 退出")
@@ -68,6 +82,24 @@ class HandEyeCalibrationUI(QMainWindow):
         # 创建定时器更新摄像头画面
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_frame)
+
+        # JPEG编码放到后台线程，采集后立刻可以输入位姿
+        self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+        # 半分辨率灰度缓冲按首帧尺寸惰性分配，之后每帧复用
+        self._gray = None
+
+        # Format_BGR888需要Qt>=5.14，老版本回退到一次BGR->RGB转换
+        self._use_bgr888 = QT_VERSION >= 0x050E00 and hasattr(QImage, "Format_BGR888")
+
+        # 最近一次检测通过的帧快照 (frame, corners, 时间戳)，采集时直接复用
+        self._valid_snapshot = None
+
+        # 位姿按列式float64数组累积，每次采集同步保存poses.npy供下游直接加载
+        self._poses = np.empty((256, 6), np.float64)
+        self._pose_n = 0
+        # 采集时顺带构建4x4齐次变换张量，下游标定可一次加载
+        self._T_stack = np.empty((256, 4, 4), np.float32)
         
     def load_config(self):
         """加载标定板配置参数"""
@@ -81,9 +113,7 @@ class HandEyeCalibrationUI(QMainWindow):
             
             self.W = data.get("W")
             self.H = data.get("H")
-            # 设置亚像素角点检测参数
-            self.criteria = (cv2.TERM_CRITERIA_MAX_ITER | cv2.TERM_CRITERIA_EPS, 30, 0.001)
-            
+
         except Exception as e:
             QMessageBox.critical(self, "配置错误", f"加载配置文件失败: {str(e)}")
             self.XX, self.YY, self.L = 9, 6, 0.02  # 默认值
@@ -91,49 +121,48 @@ class HandEyeCalibrationUI(QMainWindow):
     def init_camera(self):
         """初始化摄像头"""
         self.cap = cv2.VideoCapture(0)  # 默认摄像头
+        # 请求MJPG格式：相机内压缩，USB带宽比未压缩YUYV低一个数量级
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
         # 设置分辨率（可选，根据需要调整）
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.W)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.H)
-        
+        self.cap.set(cv2.CAP_PROP_FPS, 30)
+        # 缓冲设为1，让驱动丢弃过期帧，降低画面延迟
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
         if not self.cap.isOpened():
             QMessageBox.critical(self, "摄像头错误", "无法打开摄像头，请检查设备连接")
             self.close()
-        
-        # 验证实际分辨率
+
+        # 验证实际协商到的分辨率和格式
         actual_width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
         actual_height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        print(f"摄像头实际分辨率: {actual_width}x{actual_height}")
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, 'little').decode(errors='replace')
+        print(f"摄像头实际分辨率: {actual_width}x{actual_height} 格式: {fourcc}")
     
     def get_next_save_dir(self):
         """自动生成下一个保存目录（格式：dataYYYYMMDDXX）"""
+        if getattr(self, "_next_dir_cache", None):
+            return self._next_dir_cache
+
         # 获取当前日期（YYYYMMDD格式）
         today = datetime.now().strftime("%Y%m%d")
         base_name = f"data{today}"
-        
+
         # 确保基础目录存在
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
-        
-        # 查找当前日期下已存在的组号
-        existing_dirs = []
-        for dir_name in os.listdir(self.base_dir):
-            if dir_name.startswith(base_name) and len(dir_name) == len(base_name) + 2:
-                # 提取末尾的两位数字
-                suffix = dir_name[-2:]
-                if suffix.isdigit():
-                    existing_dirs.append(int(suffix))
-        
-        # 确定下一个组号（两位数字，从01开始）
-        if existing_dirs:
-            next_num = max(existing_dirs) + 1
-        else:
-            next_num = 1
-        
+
+        # 用scandir+正则一次扫描找出当前日期下已有的最大组号（scandir不会逐项stat）
+        pat = re.compile(rf'^{re.escape(base_name)}(\d{{2}})$')
+        next_num = 1 + max((int(m.group(1)) for e in os.scandir(self.base_dir)
+                            if e.is_dir() and (m := pat.match(e.name))), default=0)
+
         # 格式化为两位数字（01, 02, ..., 99）
         next_suffix = f"{next_num:02d}"
-        new_dir = os.path.join(self.base_dir, f"{base_name}{next_suffix}")
-        
-        return new_dir
+        self._next_dir_cache = os.path.join(self.base_dir, f"{base_name}{next_suffix}")
+
+        return self._next_dir_cache
     
     def init_data_storage(self):
         """初始化数据存储目录（自动生成格式：dataYYYYMMDDXX）"""
@@ -146,11 +175,10 @@ class HandEyeCalibrationUI(QMainWindow):
         
         # 初始化位姿文件路径
         self.poses_file = os.path.join(self.save_dir, "poses.txt")
-        
-        # 清空已有poses.txt文件
-        with open(self.poses_file, 'w') as f:
-            pass
-        
+
+        # 位姿文件整个会话保持打开（行缓冲），免去每次采集的open/close系统调用
+        self._poses_fh = open(self.poses_file, 'w', buffering=1)
+
         self.status_label.setText(f"保存目录已创建: {self.save_dir}")
     
     def choose_save_dir(self):
@@ -162,9 +190,11 @@ class HandEyeCalibrationUI(QMainWindow):
             # 如果目录不存在则创建
             if not os.path.exists(self.save_dir):
                 os.makedirs(self.save_dir)
-            # 清空或创建poses.txt
-            with open(self.poses_file, 'w') as f:
-                pass
+            # 切换目录时重开poses.txt长期句柄
+            if getattr(self, "_poses_fh", None):
+                self._poses_fh.close()
+            self._poses_fh = open(self.poses_file, 'w', buffering=1)
+            self._pose_n = 0
             self.status_label.setText(f"保存目录已设置: {self.save_dir}")
     
     def start_capture(self):
@@ -173,7 +203,8 @@ class HandEyeCalibrationUI(QMainWindow):
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
         self.status_label.setText(f"采集已开始 - 保存至: {os.path.basename(self.save_dir)} - 按 's' 采集数据，按 'q' 退出")
-        self.timer.start(30)  # 约33fps
+        # 短间隔轮询，帧没到就立刻返回，避免30ms定时器和相机帧率产生拍频
+        self.timer.start(5)
     
     def stop_capture(self):
         """停止采集"""
@@ -185,26 +216,42 @@ class HandEyeCalibrationUI(QMainWindow):
     
     def update_frame(self):
         """更新摄像头画面并检测棋盘格"""
-        ret, frame = self.cap.read()
+        # 没有新帧时grab直接失败返回，不做任何下游处理
+        if not self.cap.grab():
+            return
+        ret, frame = self.cap.retrieve()
         if ret:
-            # 检测棋盘格
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            ret_corners, corners = cv2.findChessboardCorners(gray, (self.XX, self.YY), None)
-            
-            # 如果检测到角点，绘制角点
+            # 预览画面用半分辨率检测棋盘格，减少每帧计算量（采集时仍用全分辨率）
+            small = cv2.pyrDown(frame)
+            if self._gray is None:
+                self._gray = np.empty(small.shape[:2], np.uint8)
+            gray_small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            ret_corners, corners = cv2.findChessboardCornersSB(
+                gray_small, self._board,
+                flags=cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY)
+
+            # 如果检测到角点，把角点坐标放大回原始分辨率后绘制
             if ret_corners:
-                corners2 = cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), self.criteria)
-                cv2.drawChessboardCorners(frame, (self.XX, self.YY), corners2, ret_corners)
+                corners = corners * 2.0
+                # 在绘制角点前缓存干净的帧，采集时无需重新读帧/检测
+                self._valid_snapshot = (frame.copy(), corners, time.monotonic())
+                cv2.drawChessboardCorners(frame, self._board, corners, ret_corners)
                 self.status_label.setText(f"检测到棋盘格 - 保存至: {os.path.basename(self.save_dir)} - 按 's' 采集第 {self.capture_count + 1} 组数据")
             else:
                 self.status_label.setText(f"未检测到棋盘格 - 保存至: {os.path.basename(self.save_dir)} - 请调整摄像头位置")
             
-            # 转换为Qt格式并显示
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, c = rgb_frame.shape
-            qimg = QImage(rgb_frame.data, w, h, w * c, QImage.Format_RGB888)
+            # 直接用BGR缓冲构造QImage（Qt>=5.14支持Format_BGR888），省去整帧颜色转换
+            h, w, _ = frame.shape
+            if self._use_bgr888:
+                self._last_frame = frame  # 保持缓冲区存活，QImage直接引用其内存
+                qimg = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+            else:
+                # 老版本Qt走一次颜色转换的兼容路径
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                self._last_frame = rgb_frame
+                qimg = QImage(rgb_frame.data, w, h, rgb_frame.strides[0], QImage.Format_RGB888)
             self.camera_label.setPixmap(QPixmap.fromImage(qimg).scaled(
-                self.camera_label.width(), self.camera_label.height(), Qt.KeepAspectRatio))
+                self._label_w, self._label_h, Qt.KeepAspectRatio, Qt.FastTransformation))
     
     def keyPressEvent(self, event):
         """处理键盘事件"""
@@ -215,22 +262,30 @@ class HandEyeCalibrationUI(QMainWindow):
     
     def capture_data(self):
         """采集数据"""
-        # 获取当前帧
-        ret, frame = self.cap.read()
-        if not ret:
-            QMessageBox.warning(self, "采集失败", "无法获取摄像头画面")
-            return
-        
-        # 检测棋盘格是否存在
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        ret_corners, _ = cv2.findChessboardCorners(gray, (self.XX, self.YY), None)
-        if not ret_corners:
-            QMessageBox.warning(self, "采集失败", "未检测到棋盘格，请调整后重试")
-            return
+        # 优先复用预览线程刚验证过的检测快照，避免重复读帧和重复检测
+        snap = self._valid_snapshot
+        if snap is not None and time.monotonic() - snap[2] < 0.2:
+            frame = snap[0]
+        else:
+            # 快照过期，重新读帧并做全分辨率检测
+            ret, frame = self.cap.read()
+            if not ret:
+                QMessageBox.warning(self, "采集失败", "无法获取摄像头画面")
+                return
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            ret_corners, _ = cv2.findChessboardCornersSB(
+                gray, self._board,
+                flags=cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY)
+            if not ret_corners:
+                QMessageBox.warning(self, "采集失败", "未检测到棋盘格，请调整后重试")
+                return
         
-        # 保存图像（文件名从0开始递增）
+        # 保存图像（文件名从0开始递增），编码交给后台线程，不阻塞界面
         image_path = os.path.join(self.save_dir, f"{self.capture_count}.jpg")
-        cv2.imwrite(image_path, frame)
+        write_future = self._io_pool.submit(
+            cv2.imwrite, image_path, frame,
+            [cv2.IMWRITE_JPEG_QUALITY, 92, cv2.IMWRITE_JPEG_OPTIMIZE, 0])
         
         # 获取机械臂位姿输入
         pose_str, ok = QInputDialog.getText(
@@ -240,36 +295,48 @@ class HandEyeCalibrationUI(QMainWindow):
         
         if ok and pose_str:
             try:
-                # 解析输入
-                pose = list(map(float, pose_str.split()))
-                if len(pose) != 6:
+                # 解析输入（一次向量化解析6个数）
+                vals = np.array(pose_str.split(), dtype=np.float64)
+                if vals.size != 6:
                     raise ValueError("需要6个参数")
-                
-                # 转换单位：mm -> m，deg -> rad
-                x, y, z, rx, ry, rz = pose
-                x_m = x / 1000.0
-                y_m = y / 1000.0
-                z_m = z / 1000.0
-                
-                # 角度转弧度
-                rx_rad = np.radians(rx)
-                ry_rad = np.radians(ry)
-                rz_rad = np.radians(rz)
-                
-                # 保存到位姿文件
-                with open(self.poses_file, 'a') as f:
-                    f.write(f"{x_m:.6f},{y_m:.6f},{z_m:.6f},{rx_rad:.6f},{ry_rad:.6f},{rz_rad:.6f}\n")
+
+                # 转换单位：mm -> m，deg -> rad（原地向量化）
+                vals[:3] *= 1e-3
+                vals[3:] *= np.pi / 180.0
+
+                # 保存到位姿文件，采集成功时强制落盘，程序崩溃也不丢数据
+                self._poses_fh.write(",".join(f"{v:.6f}" for v in vals) + "\n")
+                self._poses_fh.flush()
+                os.fsync(self._poses_fh.fileno())
+
+                # 同步累积到列式数组并保存poses.npy（poses.txt保留作兼容）
+                if self._pose_n == len(self._poses):
+                    self._poses = np.vstack([self._poses, np.empty_like(self._poses)])
+                    self._T_stack = np.concatenate([self._T_stack, np.empty_like(self._T_stack)])
+                self._poses[self._pose_n] = vals
+
+                # 采集时直接构建4x4齐次变换，免去下游逐个欧拉角转换
+                T = np.eye(4, dtype=np.float32)
+                T[:3, :3] = R.from_euler('xyz', vals[3:]).as_matrix()
+                T[:3, 3] = vals[:3]
+                self._T_stack[self._pose_n] = T
+
+                self._pose_n += 1
+                np.save(os.path.join(self.save_dir, "poses.npy"), self._poses[:self._pose_n])
+                np.save(os.path.join(self.save_dir, "poses_T.npy"), self._T_stack[:self._pose_n])
                 
                 self.capture_count += 1
                 self.status_label.setText(f"已采集 {self.capture_count} 组数据 - 保存至: {os.path.basename(self.save_dir)} - 按 's' 继续采集")
                 
             except ValueError as e:
                 QMessageBox.warning(self, "输入错误", f"位姿格式错误: {str(e)}\n请使用空格分隔6个数值")
-                # 删除已保存的图像
+                # 等待后台写盘完成后删除已保存的图像
+                write_future.result()
                 if os.path.exists(image_path):
                     os.remove(image_path)
         else:
-            # 用户取消输入，删除已保存的图像
+            # 用户取消输入，等待后台写盘完成后删除已保存的图像
+            write_future.result()
             if os.path.exists(image_path):
                 os.remove(image_path)
     
@@ -277,6 +344,10 @@ class HandEyeCalibrationUI(QMainWindow):
         """关闭窗口时释放资源"""
         if hasattr(self, 'cap'):
             self.cap.release()
+        if hasattr(self, '_io_pool'):
+            self._io_pool.shutdown(wait=True)
+        if getattr(self, "_poses_fh", None):
+            self._poses_fh.close()
         event.accept()
 
 if __name__ == "__main__":
@@ -6,6 +6,7 @@
 """
 
 import os
+import sys
 import logging
 
 import yaml
@@ -31,14 +32,15 @@ XX = data.get("checkerboard_args").get("XX") #标定板的中长度对应的角
 YY = data.get("checkerboard_args").get("YY") #标定板的中宽度对应的角点的个数
 L = data.get("checkerboard_args").get("L")   #标定板一格的长度  单位为米
 
+# --legacy-detector 保留旧检测路径（findChessboardCorners+cornerSubPix），
+# 用于和历史标定结果做严格数值对齐
+USE_LEGACY_DETECTOR = "--legacy-detector" in sys.argv
+
 def to_hand_calib(images_path, file_path):
 
     path = os.path.dirname(__file__)
     print(path)
 
-    # 设置寻找亚像素角点的参数，采用的停止准则是最大循环次数30和最大误差容限0.001
-    criteria = (cv2.TERM_CRITERIA_MAX_ITER | cv2.TERM_CRITERIA_EPS, 30, 0.001)
-
     # 获取标定板角点的位置
     objp = np.zeros((XX * YY, 3), np.float32)
     objp[:, :2] = np.mgrid[0:XX, 0:YY].T.reshape(-1, 2)     # 将世界坐标系建在标定板上，所有点的Z坐标全部为0，所以只需要赋值x和y
@@ -61,16 +63,27 @@ def to_hand_calib(images_path, file_path):
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
             size = gray.shape[::-1]
-            ret, corners = cv2.findChessboardCorners(gray, (XX, YY), None)
 
-            if ret:
+            if USE_LEGACY_DETECTOR:
+                # 设置寻找亚像素角点的参数，采用的停止准则是最大循环次数30和最大误差容限0.001
+                criteria = (cv2.TERM_CRITERIA_MAX_ITER | cv2.TERM_CRITERIA_EPS, 30, 0.001)
+                ret, corners = cv2.findChessboardCorners(gray, (XX, YY), None)
+
+                if ret:
+
+                    obj_points.append(objp)
 
-                obj_points.append(objp)
+                    corners2 = cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)  # 在原角点的基础上寻找亚像素角点
+                    if [corners2]:
+                        img_points.append(corners2)
+                    else:
+                        img_points.append(corners)
+            else:
+                # SB检测器一次输出接近1/100像素精度的角点，无需再做cornerSubPix
+                ret, corners = cv2.findChessboardCornersSB(gray, (XX, YY), flags=cv2.CALIB_CB_ACCURACY)
 
-                corners2 = cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)  # 在原角点的基础上寻找亚像素角点
-                if [corners2]:
-                    img_points.append(corners2)
-                else:
+                if ret:
+                    obj_points.append(objp)
                     img_points.append(corners)
 
     N = len(img_points)
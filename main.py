@@ -1,4 +1,6 @@
 import os
+import re
+import time
 import cv2
 import numpy as np
 import yaml
@@ -6,19 +8,79 @@ from datetime import datetime
 from scipy.spatial.transform import Rotation as R
 import sys
 import threading
+import queue
+import concurrent.futures
 import subprocess
 import shutil
 
+# 确保OpenCV启用SIMD优化内核和parallel_for_多线程（留一个核给命令行交互）
+cv2.setUseOptimized(True)
+cv2.setNumThreads(max(1, os.cpu_count() - 1))
+_hw_features = [line.strip() for line in cv2.getBuildInformation().splitlines()
+                if "Baseline" in line or "Dispatched code" in line]
+print(f"OpenCV CPU/HW features: {'; '.join(_hw_features)}")
+
 class HandEyeCalibrationCLI:
     def __init__(self):
         self.load_config()
         self.init_camera()
         self.init_data_storage()  # 自动生成保存目录
         self.capture_count = 0
-        self.frame = None  # 存储最新帧
+        # 棋盘格尺寸元组只构造一次，检测热路径直接复用
+        self._board = (self.XX, self.YY)
+        self.frame = None  # 存储最新帧（指向预分配缓冲的引用）
         self.detected_chessboard = False  # 棋盘格检测状态
+        # 最近一次检测通过的帧快照 (frame, corners, 时间戳)，采集时直接复用
+        self._valid_snapshot = None
         self.running = True  # 程序运行标志
-    
+
+        # 预分配显示缓冲，避免显示线程每帧堆分配和整帧拷贝
+        self._disp = np.empty((self.H, self.W, 3), np.uint8)
+        self._gray = np.empty((self.H // 2, self.W // 2), np.uint8)
+        # 文字图层只在状态变化时重绘，平时直接叠加缓存
+        self._text_overlay = np.zeros((self.H, self.W, 3), np.uint8)
+        self._last_status = None
+
+        # 位姿按列式float64数组累积，每次采集同步保存poses.npy供下游直接加载
+        self._poses = np.empty((256, 6), np.float64)
+        self._pose_n = 0
+        # 采集时顺带构建4x4齐次变换张量，下游标定可一次加载
+        self._T_stack = np.empty((256, 4, 4), np.float32)
+
+        self._frame_lock = threading.Lock()
+        # 抓帧线程和检测/显示线程之间的帧队列（容量2，满了丢最旧帧）
+        self._frame_q = queue.Queue(maxsize=2)
+        # 3槽环形缓冲：retrieve直接写入预分配槽位，线程间只传引用不拷贝
+        self._ring = [np.empty((self.H, self.W, 3), np.uint8) for _ in range(3)]
+        self._ring_idx = 0
+        # 显示线程取到帧后立刻拷入该专用缓冲：环形槽位随后会被抓帧线程复用，
+        # 发布给capture_data的必须是不再变化的像素
+        self._latest = np.empty((self.H, self.W, 3), np.uint8)
+        # JPEG编码放到后台线程，采集后立刻可以输入下一组位姿
+        self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+        # 有OpenCL时走T-API（UMat），把颜色转换和角点检测卸载到核显
+        self._use_opencl = cv2.ocl.haveOpenCL()
+        if self._use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+
+        # 后台预热计算模块的导入，首次按 i/o 时不再停顿
+        self._ready_evt = threading.Event()
+        self._warm_error = None
+        threading.Thread(target=self._warm_imports, daemon=True).start()
+
+    def _warm_imports(self):
+        """后台导入重量级计算模块，消除首次计算时的导入延迟"""
+        try:
+            import compute_in_hand
+            import compute_to_hand
+            from libs.auxiliary import find_latest_data_folder
+        except Exception as e:
+            # 记下异常由计算入口报告，事件必须置位，否则wait会永远卡住
+            self._warm_error = e
+        finally:
+            self._ready_evt.set()
+
     def load_config(self):
         """加载标定板配置参数"""
         try:
@@ -31,9 +93,7 @@ class HandEyeCalibrationCLI:
             
             self.W = data.get("W", 1280)  # 默认1280
             self.H = data.get("H", 720)   # 默认720
-            # 设置亚像素角点检测参数
-            self.criteria = (cv2.TERM_CRITERIA_MAX_ITER | cv2.TERM_CRITERIA_EPS, 30, 0.001)
-            
+
         except Exception as e:
             print(f"加载配置文件失败: {str(e)}")
             print("使用默认配置参数")
@@ -43,43 +103,46 @@ class HandEyeCalibrationCLI:
     def init_camera(self):
         """初始化摄像头"""
         self.cap = cv2.VideoCapture(0)  # 默认摄像头
+        # 请求MJPG格式：相机内压缩，USB带宽比未压缩YUYV低一个数量级
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
         # 设置分辨率
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.W)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.H)
-        
+        self.cap.set(cv2.CAP_PROP_FPS, 30)
+        # 缓冲设为1，让驱动丢弃过期帧，降低画面延迟
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
         if not self.cap.isOpened():
             print("无法打开摄像头，请检查设备连接")
             sys.exit(1)
-        
-        # 验证实际分辨率
+
+        # 验证实际协商到的分辨率和格式
         actual_width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
         actual_height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        print(f"摄像头实际分辨率: {actual_width}x{actual_height}")
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, 'little').decode(errors='replace')
+        print(f"摄像头实际分辨率: {actual_width}x{actual_height} 格式: {fourcc}")
     
     def get_next_save_dir(self):
         """自动生成下一个保存目录（格式：dataYYYYMMDDXX）"""
+        if getattr(self, "_next_dir_cache", None):
+            return self._next_dir_cache
+
         self.base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eye_hand_data")
         today = datetime.now().strftime("%Y%m%d")
         base_name = f"data{today}"
-        
+
         # 确保基础目录存在
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
-        
-        # 查找当前日期下已存在的组号
-        existing_dirs = []
-        for dir_name in os.listdir(self.base_dir):
-            if dir_name.startswith(base_name) and len(dir_name) == len(base_name) + 2:
-                suffix = dir_name[-2:]
-                if suffix.isdigit():
-                    existing_dirs.append(int(suffix))
-        
-        # 确定下一个组号
-        next_num = max(existing_dirs) + 1 if existing_dirs else 1
+
+        # 用scandir+正则一次扫描找出当前日期下已有的最大组号（scandir不会逐项stat）
+        pat = re.compile(rf'^{re.escape(base_name)}(\d{{2}})$')
+        next_num = 1 + max((int(m.group(1)) for e in os.scandir(self.base_dir)
+                            if e.is_dir() and (m := pat.match(e.name))), default=0)
         next_suffix = f"{next_num:02d}"
-        new_dir = os.path.join(self.base_dir, f"{base_name}{next_suffix}")
-        
-        return new_dir
+        self._next_dir_cache = os.path.join(self.base_dir, f"{base_name}{next_suffix}")
+
+        return self._next_dir_cache
     
     def init_data_storage(self):
         """初始化数据存储目录"""
@@ -91,57 +154,118 @@ class HandEyeCalibrationCLI:
         
         # 初始化位姿文件路径
         self.poses_file = os.path.join(self.save_dir, "poses.txt")
-        
-        # 清空已有poses.txt文件
-        with open(self.poses_file, 'w') as f:
-            pass
-        
+
+        # 位姿文件整个会话保持打开（行缓冲），免去每次采集的open/close系统调用
+        self._poses_fh = open(self.poses_file, 'w', buffering=1)
+
         print(f"\n保存目录已创建: {self.save_dir}")
         print("=" * 60)
     
+    def camera_grab_thread(self):
+        """抓帧线程：只做cap.grab/retrieve，把最新帧塞进队列，让采集延迟和检测计算重叠"""
+        while self.running:
+            if not self.cap.grab():
+                continue
+            # 轮转写入环形缓冲的下一个槽位，避免每帧堆分配
+            ret, frame = self.cap.retrieve(self._ring[self._ring_idx])
+            if not ret:
+                continue
+            self._ring_idx = (self._ring_idx + 1) % len(self._ring)
+            try:
+                self._frame_q.put_nowait(frame)
+            except queue.Full:
+                # 丢掉最旧的一帧，保证检测总是处理最新画面
+                try:
+                    self._frame_q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self._frame_q.put_nowait(frame)
+                except queue.Full:
+                    pass
+
+        self.cap.release()
+
+    def _detect_chessboard(self, gray):
+        """在灰度图上运行SB棋盘格检测"""
+        return cv2.findChessboardCornersSB(
+            gray, self._board,
+            flags=cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY)
+
     def camera_display_thread(self):
-        """摄像头画面显示线程（独立于命令行输入）"""
+        """棋盘格检测和画面显示线程（独立于命令行输入）"""
         while self.running:
-            ret, frame = self.cap.read()
-            if ret:
-                self.frame = frame.copy()
-                
-                # 检测棋盘格
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                ret_corners, corners = cv2.findChessboardCorners(gray, (self.XX, self.YY), None)
-                self.detected_chessboard = ret_corners
-                
-                # 绘制角点和状态文字
-                display_frame = frame.copy()
-                status_text = f"已采集: {self.capture_count} 组 | 保存目录: {os.path.basename(self.save_dir)}"
-                
+            try:
+                frame = self._frame_q.get(timeout=0.1)
+            except queue.Empty:
+                # 没有新帧时只维持窗口响应
+                if cv2.pollKey() & 0xFF == ord('x'):
+                    self.running = False
+                    break
+                continue
+
+            # 趁槽位还新鲜先整帧拷贝到专用缓冲，后续检测/快照/发布都用稳定像素
+            with self._frame_lock:
+                np.copyto(self._latest, frame)
+                self.frame = self._latest
+            frame = self._latest
+
+            # 预览画面用半分辨率检测棋盘格，减少每帧计算量（采集时仍用全分辨率）
+            small = cv2.pyrDown(frame)
+            if self._use_opencl:
+                try:
+                    gray_umat = cv2.cvtColor(cv2.UMat(small), cv2.COLOR_BGR2GRAY)
+                    ret_corners, corners = self._detect_chessboard(gray_umat)
+                    if ret_corners:
+                        corners = corners.get()  # 只在最终角点结果上回读
+                except cv2.error:
+                    # 部分驱动栈在SB检测器上不稳定，出错后永久回退CPU路径
+                    self._use_opencl = False
+            if not self._use_opencl:
+                gray_small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+                ret_corners, corners = self._detect_chessboard(gray_small)
+            self.detected_chessboard = ret_corners
+
+            # 角点直接画在预分配的显示缓冲上
+            np.copyto(self._disp, frame)
+            display_frame = self._disp
+
+            if ret_corners:
+                # 把角点坐标放大回原始分辨率后绘制（绿色）
+                corners = corners * 2.0
+                # 缓存检测通过的原始帧和角点，采集时无需重新读帧/检测
+                with self._frame_lock:
+                    self._valid_snapshot = (frame.copy(), corners, time.monotonic())
+                cv2.drawChessboardCorners(display_frame, self._board, corners, ret_corners)
+
+            # 文字图层只在采集数或检测状态变化时重绘
+            status = (self.capture_count, bool(ret_corners))
+            if status != self._last_status:
+                self._text_overlay[:] = 0
                 if ret_corners:
-                    # 亚像素优化并绘制角点（绿色）
-                    corners2 = cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), self.criteria)
-                    cv2.drawChessboardCorners(display_frame, (self.XX, self.YY), corners2, ret_corners)
-                    cv2.putText(display_frame, "✅ Find Chessboard", (10, 30), 
+                    cv2.putText(self._text_overlay, "✅ Find Chessboard", (10, 30),
                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)  # 绿色
                 else:
-                    # 未检测到棋盘格（红色）
-                    cv2.putText(display_frame, "❌ Not Find Chessboard", (10, 30), 
+                    cv2.putText(self._text_overlay, "❌ Not Find Chessboard", (10, 30),
                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)  # 红色
-                
-                # 显示状态信息
-                cv2.putText(display_frame, status_text, (10, 70), 
+                status_text = f"已采集: {self.capture_count} 组 | 保存目录: {os.path.basename(self.save_dir)}"
+                cv2.putText(self._text_overlay, status_text, (10, 70),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                cv2.putText(display_frame, "命令行: s=采集 | i=眼在手上 | o=眼在手外 | q=退出", (10, 100), 
+                cv2.putText(self._text_overlay, "命令行: s=采集 | i=眼在手上 | o=眼在手外 | q=退出", (10, 100),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                
-                # 显示画面
-                cv2.imshow("手眼标定数据采集", display_frame)
-            
-            # 保持窗口响应（仅用于关闭窗口）
-            if cv2.waitKey(1) & 0xFF == ord('x'):  # 隐藏的退出快捷键，用于紧急关闭
+                self._last_status = status
+
+            # 把缓存的文字图层叠加到当前帧上
+            cv2.bitwise_or(display_frame, self._text_overlay, dst=display_frame)
+
+            # 显示画面
+            cv2.imshow("手眼标定数据采集", display_frame)
+
+            # pollKey只处理事件，不像waitKey(1)至少睡1ms
+            if cv2.pollKey() & 0xFF == ord('x'):  # 隐藏的退出快捷键，用于紧急关闭
                 self.running = False
                 break
         
-        # 释放摄像头和窗口
-        self.cap.release()
         cv2.destroyAllWindows()
     
     def start_capture(self):
@@ -159,7 +283,9 @@ class HandEyeCalibrationCLI:
         print("提示: 请关注cv2显示窗口中的棋盘格检测状态")
         print("=" * 60)
         
-        # 启动摄像头显示线程
+        # 启动抓帧线程和检测/显示线程
+        grab_thread = threading.Thread(target=self.camera_grab_thread, daemon=True)
+        grab_thread.start()
         display_thread = threading.Thread(target=self.camera_display_thread, daemon=True)
         display_thread.start()
         
@@ -213,15 +339,26 @@ class HandEyeCalibrationCLI:
                 print(f"\n❌ 操作出错: {str(e)}")
                 continue
         
-        # 等待显示线程结束
+        # 等待后台图像写盘完成，关闭位姿文件，再等抓帧和显示线程结束
+        self._io_pool.shutdown(wait=True)
+        self._poses_fh.close()
+        grab_thread.join(timeout=2.0)
         display_thread.join(timeout=2.0)
         print("\n资源已释放，程序正常退出")
     
     def capture_data(self):
         """采集数据（保存图像和位姿）"""
-        # 保存图像（使用最新帧）
+        # 优先复用显示线程刚验证过的检测快照；过期则退回最新帧（加锁拷贝）
+        with self._frame_lock:
+            snap = self._valid_snapshot
+            if snap is not None and time.monotonic() - snap[2] < 0.2:
+                frame = snap[0]
+            else:
+                frame = self.frame.copy()
         image_path = os.path.join(self.save_dir, f"{self.capture_count}.jpg")
-        cv2.imwrite(image_path, self.frame)
+        write_future = self._io_pool.submit(
+            cv2.imwrite, image_path, frame,
+            [cv2.IMWRITE_JPEG_QUALITY, 92, cv2.IMWRITE_JPEG_OPTIMIZE, 0])
         print(f"\n📷 已保存图像: {os.path.basename(image_path)}")
         
         # 命令行输入机械臂位姿
@@ -234,7 +371,8 @@ class HandEyeCalibrationCLI:
             pose_input = input("请输入位姿: ").strip()
             
             if pose_input.lower() == 'cancel':
-                # 取消采集，删除已保存的图像
+                # 取消采集，等待后台写盘完成后删除已保存的图像
+                write_future.result()
                 if os.path.exists(image_path):
                     os.remove(image_path)
                 print("❌ 本次采集已取消")
@@ -245,29 +383,42 @@ class HandEyeCalibrationCLI:
                 continue
             
             try:
-                # 解析输入
-                pose = list(map(float, pose_input.split()))
-                if len(pose) != 6:
-                    raise ValueError(f"需要6个参数，实际输入了{len(pose)}个")
-                
-                x, y, z, rx, ry, rz = pose
-                
-                # 单位转换：mm -> m，deg -> rad
-                x_m = x / 1000.0
-                y_m = y / 1000.0
-                z_m = z / 1000.0
-                rx_rad = np.radians(rx)
-                ry_rad = np.radians(ry)
-                rz_rad = np.radians(rz)
-                
-                # 保存到位姿文件
-                with open(self.poses_file, 'a') as f:
-                    f.write(f"{x_m:.6f},{y_m:.6f},{z_m:.6f},{rx_rad:.6f},{ry_rad:.6f},{rz_rad:.6f}\n")
-                
+                # 解析输入（一次向量化解析6个数）
+                vals = np.array(pose_input.split(), dtype=np.float64)
+                if vals.size != 6:
+                    raise ValueError(f"需要6个参数，实际输入了{vals.size}个")
+
+                raw = vals.copy()
+
+                # 单位转换：mm -> m，deg -> rad（原地向量化）
+                vals[:3] *= 1e-3
+                vals[3:] *= np.pi / 180.0
+
+                # 保存到位姿文件，采集成功时强制落盘，程序崩溃也不丢数据
+                self._poses_fh.write(",".join(f"{v:.6f}" for v in vals) + "\n")
+                self._poses_fh.flush()
+                os.fsync(self._poses_fh.fileno())
+
+                # 同步累积到列式数组并保存poses.npy（poses.txt保留作兼容）
+                if self._pose_n == len(self._poses):
+                    self._poses = np.vstack([self._poses, np.empty_like(self._poses)])
+                    self._T_stack = np.concatenate([self._T_stack, np.empty_like(self._T_stack)])
+                self._poses[self._pose_n] = vals
+
+                # 采集时直接构建4x4齐次变换，免去下游逐个欧拉角转换
+                T = np.eye(4, dtype=np.float32)
+                T[:3, :3] = R.from_euler('xyz', vals[3:]).as_matrix()
+                T[:3, 3] = vals[:3]
+                self._T_stack[self._pose_n] = T
+
+                self._pose_n += 1
+                np.save(os.path.join(self.save_dir, "poses.npy"), self._poses[:self._pose_n])
+                np.save(os.path.join(self.save_dir, "poses_T.npy"), self._T_stack[:self._pose_n])
+
                 self.capture_count += 1
                 print(f"\n✅ 第 {self.capture_count} 组数据采集成功！")
-                print(f"   原始位姿（mm, deg）: {x:.2f}, {y:.2f}, {z:.2f}, {rx:.2f}, {ry:.2f}, {rz:.2f}")
-                print(f"   转换后（m, rad）: {x_m:.6f}, {y_m:.6f}, {z_m:.6f}, {rx_rad:.6f}, {ry_rad:.6f}, {rz_rad:.6f}")
+                print(f"   原始位姿（mm, deg）: {', '.join(f'{v:.2f}' for v in raw)}")
+                print(f"   转换后（m, rad）: {', '.join(f'{v:.6f}' for v in vals)}")
                 break
                 
             except ValueError as e:
@@ -280,7 +431,12 @@ class HandEyeCalibrationCLI:
             print("\n🔧 开始眼在手上标定计算...")
             print("计算相机相对于机械臂末端的位姿")
             print("=" * 60)
-            
+
+            # 等待后台预热导入完成（通常早已就绪）；导入失败则照旧走错误提示
+            self._ready_evt.wait()
+            if self._warm_error is not None:
+                raise self._warm_error
+
             # 检查数据目录是否存在
             current_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eye_hand_data")
             if not os.path.exists(current_path):
@@ -354,7 +510,12 @@ class HandEyeCalibrationCLI:
             print("\n🔧 开始眼在手外标定计算...")
             print("计算相机相对于机械臂基座的位姿")
             print("=" * 60)
-            
+
+            # 等待后台预热导入完成（通常早已就绪）；导入失败则照旧走错误提示
+            self._ready_evt.wait()
+            if self._warm_error is not None:
+                raise self._warm_error
+
             # 检查数据目录是否存在
             current_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eye_hand_data")
             if not os.path.exists(current_path):
@@ -6,6 +6,8 @@
 """
 
 import csv
+import os
+
 import numpy as np
 
 
@@ -13,18 +15,30 @@ import numpy as np
 def poses2_main(tag):
 
 
-    with open(f"{tag}", "r",encoding="utf-8") as f:
-        # 读取文件中的所有行
-        lines = f.readlines()
-    # 定义一个空列表，用于存储结果
+    # 最优先读取采集时预先构建好的4x4齐次变换张量，省去逐位姿的欧拉角转换
+    T_path = os.path.join(os.path.dirname(tag), "poses_T.npy")
+    if os.path.exists(T_path):
+        matrices = [inverse_transformation_matrix(T.astype(np.float64)) for T in np.load(T_path)]
+        save_matrices_to_csv(matrices, f'RobotToolPose.csv')
+        return
+
+    # 其次读取同目录下的poses.npy（结构化存储，省去逐行文本解析）
+    npy_path = os.path.join(os.path.dirname(tag), "poses.npy")
+    if os.path.exists(npy_path):
+        poses = np.load(npy_path)
+    else:
+        with open(f"{tag}", "r",encoding="utf-8") as f:
+            # 读取文件中的所有行
+            lines = f.readlines()
 
-    # 遍历每一行数据
-    lines = [float(i)  for line in lines for i in line.split(',')]
+        # 遍历每一行数据
+        lines = [float(i)  for line in lines for i in line.split(',')]
+        poses = np.array(lines, dtype=np.float64).reshape(-1, 6)
 
     matrices = []
 
-    for i in range(0,len(lines),6):
-        matrices.append(inverse_transformation_matrix(pose_to_homogeneous_matrix(lines[i:i+6])))
+    for pose in poses:
+        matrices.append(inverse_transformation_matrix(pose_to_homogeneous_matrix(pose)))
 
 
     # 将齐次变换矩阵列表存储到 CSV 文件中